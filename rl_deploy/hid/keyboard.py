@@ -2,20 +2,20 @@
 
 from dataclasses import dataclass
 
-import numpy as np
-import pygame
+# bound by Keyboard.__init__, importing this module does not load pygame
+pygame = None
 
 
 @dataclass
 class KeyboardConfig:
     """dataclass holding keyboard configuration data"""
 
-    forward_key: int = pygame.K_w  # key for forward movement
-    backward_key: int = pygame.K_s  # key for backward movement
-    left_key: int = pygame.K_a  # key for left movement
-    right_key: int = pygame.K_d  # key for right movement
-    yaw_left_key: int = pygame.K_q  # key for yaw left
-    yaw_right_key: int = pygame.K_e  # key for yaw right
+    forward_key: int = ord("w")  # pygame.K_w, key for forward movement
+    backward_key: int = ord("s")  # pygame.K_s, key for backward movement
+    left_key: int = ord("a")  # pygame.K_a, key for left movement
+    right_key: int = ord("d")  # pygame.K_d, key for right movement
+    yaw_left_key: int = ord("q")  # pygame.K_q, key for yaw left
+    yaw_right_key: int = ord("e")  # pygame.K_e, key for yaw right
     delta_forward_velocity: float = 0.5  # increment for forward/backward velocity
     delta_lateral_velocity: float = 0.5  # increment for lateral velocity
     delta_yaw_velocity: float = 0.5  # increment for yaw velocity
@@ -23,7 +23,7 @@ class KeyboardConfig:
     max_backward_velocity: float = 1.0  # maximum backward velocity
     max_lateral_velocity: float = 1.0  # maximum lateral velocity
     max_yaw_velocity: float = 1.0  # maximum yaw velocity
-    stop_key: int = pygame.K_SPACE  # key to stop the controller
+    stop_key: int = ord(" ")  # pygame.K_SPACE, key to stop the controller
 
 
 class Keyboard:
@@ -32,6 +32,9 @@ class Keyboard:
    
 
     def __init__(self, context, config: KeyboardConfig = None, verbose: bool = False, x_vel=0.0, y_vel=0.0, yaw=0.0):
+        global pygame
+        import pygame
+
         if not pygame.get_init():
             pygame.init()
         
@@ -43,6 +46,15 @@ class Keyboard:
         self._config = config if config is not None else KeyboardConfig()
         self._verbose = verbose
 
+        # Key codes read every loop, resolved once from the config
+        self._k_fwd = self._config.forward_key
+        self._k_back = self._config.backward_key
+        self._k_left = self._config.left_key
+        self._k_right = self._config.right_key
+        self._k_yaw_left = self._config.yaw_left_key
+        self._k_yaw_right = self._config.yaw_right_key
+        self._k_stop = self._config.stop_key
+
         self._create_main_window()
 
     def _create_main_window(self):
@@ -52,26 +64,11 @@ class Keyboard:
         self._font: pygame.font.Font = pygame.font.Font(None, 36)
         self._small_font: pygame.font.Font = pygame.font.Font(None, 24)
 
-        controls_title = self._small_font.render("Controls:", True, (255, 255, 255))
-        self._screen.blit(controls_title, (250, 20))
-
-        self._update_display()
-
-    def _update_display(self):
-
-        self._screen.fill((30, 30, 30))
-        
-        # Render velocity information
-        title_text = self._font.render("Velocity Status", True, (255, 255, 255))
-        self._screen.blit(title_text, (20, 20))
-
-        x_text = self._small_font.render(f"X (Forward/Back): {self.x_vel:.2f}", True, (100, 255, 100))
-        y_text = self._small_font.render(f"Y (Left/Right):   {self.y_vel:.2f}", True, (100, 200, 255))
-        yaw_text = self._small_font.render(f"Yaw (Rotation):   {self.yaw:.2f}", True, (255, 200, 100))
-        
-        self._screen.blit(x_text, (20, 80))
-        self._screen.blit(y_text, (20, 120))
-        self._screen.blit(yaw_text, (20, 160))
+        # Static text never changes, render it once and only blit it on repaint
+        self._static_text = [
+            (self._font.render("Velocity Status", True, (255, 255, 255)), (20, 20)),
+            (self._small_font.render("Controls:", True, (255, 255, 255)), (250, 20)),
+        ]
         key_map = {
             "Fwd": self._config.forward_key,
             "Back": self._config.backward_key,
@@ -86,8 +83,31 @@ class Keyboard:
         for action, key in key_map.items():
             key_name = pygame.key.name(key).upper()
             text = self._small_font.render(f"{action}: {key_name}", True, (200, 200, 200))
-            self._screen.blit(text, (250, y_offset))
+            self._static_text.append((text, (250, y_offset)))
             y_offset += 30
+
+        self._displayed_velocity = None
+        self._update_display()
+
+    def _update_display(self):
+        # Skip the repaint while the velocities shown are still current
+        velocity = (self.x_vel, self.y_vel, self.yaw)
+        if velocity == self._displayed_velocity:
+            return
+        self._displayed_velocity = velocity
+
+        self._screen.fill((30, 30, 30))
+        for surface, position in self._static_text:
+            self._screen.blit(surface, position)
+
+        # Render velocity information
+        x_text = self._small_font.render(f"X (Forward/Back): {self.x_vel:.2f}", True, (100, 255, 100))
+        y_text = self._small_font.render(f"Y (Left/Right):   {self.y_vel:.2f}", True, (100, 200, 255))
+        yaw_text = self._small_font.render(f"Yaw (Rotation):   {self.yaw:.2f}", True, (255, 200, 100))
+        
+        self._screen.blit(x_text, (20, 80))
+        self._screen.blit(y_text, (20, 120))
+        self._screen.blit(yaw_text, (20, 160))
         
         # Update display
         pygame.display.flip()
@@ -105,6 +125,10 @@ class Keyboard:
             if event.type == pygame.QUIT:
                 self._stopping = True
 
+            # Window was uncovered, its contents are gone so force a repaint
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self._displayed_velocity = None
+
             # Debugging: Print exactly what Pygame receives when a key goes DOWN
             if event.type == pygame.KEYDOWN and self._verbose:
                 key_name = pygame.key.name(event.key).upper()
@@ -112,42 +136,29 @@ class Keyboard:
                 
         # Get current key states
         keys = pygame.key.get_pressed()
+        cfg = self._config
 
         # Calculate target velocities based on key presses
         self._target_x_vel = 0.0
         self._target_y_vel = 0.0
         self._target_yaw = 0.0
 
-        # Forward/Backward
-        if keys[self._config.forward_key]:
-            self.x_vel += self._config.delta_forward_velocity
-        elif keys[self._config.backward_key]:
-            self.x_vel -= self._config.delta_forward_velocity
-
-        # Left/Right (lateral)
-        if keys[self._config.left_key]:
-            self.y_vel += self._config.delta_lateral_velocity
-        elif keys[self._config.right_key]:
-            self.y_vel -= self._config.delta_lateral_velocity
-
-        # Yaw
-        if keys[self._config.yaw_left_key]:
-            self.yaw += self._config.delta_yaw_velocity
-        elif keys[self._config.yaw_right_key]:
-            self.yaw -= self._config.delta_yaw_velocity
-
-        if keys[self._config.stop_key]:
+        # Opposite keys cancel out, key states are bools so they act as 0/1
+        self.x_vel += (keys[self._k_fwd] - keys[self._k_back]) * cfg.delta_forward_velocity
+        self.y_vel += (keys[self._k_left] - keys[self._k_right]) * cfg.delta_lateral_velocity
+        self.yaw += (keys[self._k_yaw_left] - keys[self._k_yaw_right]) * cfg.delta_yaw_velocity
+
+        if keys[self._k_stop]:
             self.x_vel = 0.0
             self.y_vel = 0.0
             self.yaw = 0.0
 
         # Cap velocities
-        self.x_vel = np.clip(self.x_vel, -self._config.max_backward_velocity, self._config.max_forward_velocity)
-        self.y_vel = np.clip(self.y_vel, -self._config.max_lateral_velocity, self._config.max_lateral_velocity)
-        self.yaw = np.clip(self.yaw, -self._config.max_yaw_velocity, self._config.max_yaw_velocity)
+        self.x_vel = max(-cfg.max_backward_velocity, min(cfg.max_forward_velocity, self.x_vel))
+        self.y_vel = max(-cfg.max_lateral_velocity, min(cfg.max_lateral_velocity, self.y_vel))
+        self.yaw = max(-cfg.max_yaw_velocity, min(cfg.max_yaw_velocity, self.yaw))
         
         self._context.velocity_cmd = [self.x_vel, self.y_vel, self.yaw]
-        
-        # Clear screen
+
         self._update_display()
 
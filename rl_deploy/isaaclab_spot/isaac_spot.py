@@ -1,9 +1,11 @@
 # Copyright (c) 2024 Boston Dynamics AI Institute LLC. All rights reserved.
 
 import datetime
+import functools
 from contextlib import nullcontext
 from typing import Callable
 
+import numpy as np
 import torch
 from bosdyn.api.robot_command_pb2 import JointControlStreamRequest
 from bosdyn.api.robot_state_pb2 import RobotStateStreamResponse
@@ -17,12 +19,48 @@ from rl_deploy.spot.constants import (
 from rl_deploy.utils.dict_tools import find_ordering, reorder
 
 
+@functools.lru_cache(maxsize=None)
+def _spot_to_isaac(n_joints: int):
+    """permutation from spot's joint order to the simulator's for the first n_joints joints
+
+    arguments
+    n_joints -- length of the joint command, 19 with arm or 12 for the legs only
+
+    return index tensor, or None when both orders already agree
+    """
+    ordering = find_ordering(ORDERED_JOINT_NAMES_SPOT[:n_joints], ORDERED_JOINT_NAMES_ISAAC[:n_joints])
+    if ordering == list(range(n_joints)):
+        return None
+    return torch.as_tensor(ordering, dtype=torch.long)
+
+
+# observation terms of the "spot" group read by set_state, in unpacking order
+_STATE_TERMS = (
+    "root_quat_w",
+    "root_lin_vel_w",
+    "root_ang_vel_w",
+    "joint_pos",
+    "joint_vel",
+    "joint_effort",
+    "sim_time",
+)
+
+
 class IsaacMockSpot:
     _command_thread = None
     _state_stream_stopping = False
     _command_stream_stopping = False
 
-    def __init__(self): ...
+    def __init__(self):
+        # reused for every state update instead of allocating a new message per tick
+        self._state_msg = RobotStateStreamResponse()
+        # every field below is overwritten each tick, so the message is never cleared
+        # and these sub-message references stay attached to it
+        self._timestamp = self._state_msg.header.response_timestamp
+        self._rot = self._state_msg.kinematic_state.odom_tform_body.rotation
+        self._lin = self._state_msg.kinematic_state.velocity_of_body_in_odom.linear
+        self._ang = self._state_msg.kinematic_state.velocity_of_body_in_odom.angular
+        self._js = self._state_msg.joint_states
 
     def start_state_stream(
         self, on_state_update: Callable[[RobotStateStreamResponse], None]
@@ -35,44 +73,31 @@ class IsaacMockSpot:
         available in spots state update.  note spot gives velocity in odom frame
         so we need to rotate it to current estimated pose of the base
         """
-        joint_pos = state["joint_pos"].cpu().tolist()[0]
-        joint_vel = state["joint_vel"].cpu().tolist()[0]
-        root_lin_vel_w = state["root_lin_vel_w"].cpu().tolist()[0]
-        root_ang_vel_w = state["root_ang_vel_w"].cpu().tolist()[0]
-        root_quat_w = state["root_quat_w"].cpu().tolist()[0]
-        joint_load = state["joint_effort"].cpu().tolist()[0]
-        sim_time = state["sim_time"].cpu().tolist()[0]
+        # only the first env is streamed, gather its terms on device so a single
+        # device to host copy moves the whole state
+        terms = [state[name][0] for name in _STATE_TERMS]
+        host_terms = torch.cat(terms).detach().cpu().split([t.numel() for t in terms])
+        (
+            root_quat_w,
+            root_lin_vel_w,
+            root_ang_vel_w,
+            joint_pos,
+            joint_vel,
+            joint_load,
+            sim_time,
+        ) = (term.tolist() for term in host_terms)
 
-        self._state_msg = RobotStateStreamResponse()
         sim_time_dt = datetime.datetime(2024, 1, 1) + datetime.timedelta(
             seconds=sim_time[0]
         )
-        self._state_msg.header.response_timestamp.FromDatetime(sim_time_dt)
-        self._state_msg.kinematic_state.odom_tform_body.rotation.w = root_quat_w[0]
-        self._state_msg.kinematic_state.odom_tform_body.rotation.x = root_quat_w[1]
-        self._state_msg.kinematic_state.odom_tform_body.rotation.y = root_quat_w[2]
-        self._state_msg.kinematic_state.odom_tform_body.rotation.z = root_quat_w[3]
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.linear.x = (
-            root_lin_vel_w[0]
-        )
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.linear.y = (
-            root_lin_vel_w[1]
-        )
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.linear.z = (
-            root_lin_vel_w[2]
-        )
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.angular.x = (
-            root_ang_vel_w[0]
-        )
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.angular.y = (
-            root_ang_vel_w[1]
-        )
-        self._state_msg.kinematic_state.velocity_of_body_in_odom.angular.z = (
-            root_ang_vel_w[2]
-        )
-        self._state_msg.joint_states.position.extend(joint_pos)
-        self._state_msg.joint_states.velocity.extend(joint_vel)
-        self._state_msg.joint_states.load.extend(joint_load)
+        self._timestamp.FromDatetime(sim_time_dt)
+        rot, lin, ang, js = self._rot, self._lin, self._ang, self._js
+        rot.w, rot.x, rot.y, rot.z = root_quat_w
+        lin.x, lin.y, lin.z = root_lin_vel_w
+        ang.x, ang.y, ang.z = root_ang_vel_w
+        js.position[:] = joint_pos
+        js.velocity[:] = joint_vel
+        js.load[:] = joint_load
 
         self._on_state_update(self._state_msg)
 
@@ -89,7 +114,14 @@ class IsaacMockSpot:
 
     def command_update(self):
         positions = self._command_generator().joint_command.position
-        return torch.tensor(positions).unsqueeze(0)
+        # stage through numpy, torch.from_numpy shares the buffer instead of
+        # inferring a tensor from a python sequence
+        positions_np = np.fromiter(positions, dtype=np.float32, count=len(positions))
+        positions_t = torch.from_numpy(positions_np)
+        spot_to_isaac = _spot_to_isaac(len(positions_np))
+        if spot_to_isaac is not None:
+            positions_t = positions_t.index_select(0, spot_to_isaac)
+        return positions_t.unsqueeze_(0)
 
     def power_on(self):
         pass
@@ -1,4 +1,5 @@
 # Copyright (c) 2024 Boston Dynamics AI Institute LLC. All rights reserved.
+import functools
 import os
 import time
 from dataclasses import dataclass
@@ -11,7 +12,7 @@ import onnxruntime as ort
 from bosdyn.api import robot_command_pb2
 from bosdyn.api.robot_command_pb2 import JointControlStreamRequest
 from bosdyn.api.robot_state_pb2 import RobotStateStreamResponse
-from bosdyn.util import seconds_to_timestamp, set_timestamp_from_now, timestamp_to_sec
+from bosdyn.util import set_timestamp_from_now
 
 import rl_deploy.orbit.observations as ob
 from rl_deploy.orbit.orbit_configuration import OrbitConfig
@@ -115,6 +116,96 @@ def extract_shift_from_onnx(onnx_file_path):
     return None
 
 
+@functools.lru_cache(maxsize=1)
+def _compute_safe_limits() -> dict[str, tuple[float, float]]:
+    """
+    Generate safe limits for each joint based on the joint limits and soft limits.
+
+    The soft limits were generated from simulated data, using the formula:
+
+    max_val, min_val = max and min needed during simulation
+    max, min = max and min of the joint limit range
+
+    middle = (max + min)/2
+    full_range = max - min
+
+    min_margin = (middle - min_val)/full_range * 2
+    max_margin = (max_val - middle)/full_range * 2
+
+    """
+    safe_limits = {}
+    for joint_name in JOINT_SOFT_LIMITS:
+        lower = JOINT_LIMITS[joint_name]["lower"]
+        upper = JOINT_LIMITS[joint_name]["upper"]
+        middle = (lower + upper) / 2
+        full_range = upper - lower
+
+        min_margin, max_margin = JOINT_SOFT_LIMITS[joint_name]
+        min_val = middle - (min_margin * full_range / 2)
+        max_val = middle + (max_margin * full_range / 2)
+
+        safe_limits[joint_name] = (min_val, max_val)
+
+    return safe_limits
+
+
+@functools.lru_cache(maxsize=1)
+def _soft_limit_arrays() -> tuple[np.ndarray, np.ndarray]:
+    """safe limits as lower/upper arrays in ORDERED_JOINT_NAMES_SPOT_BASE order,
+    shared by clip_soft and OnnxCommandGenerator._check_safety"""
+    safe_limits = _compute_safe_limits()
+    lower = np.array([safe_limits[name][0] for name in ORDERED_JOINT_NAMES_SPOT_BASE])
+    upper = np.array([safe_limits[name][1] for name in ORDERED_JOINT_NAMES_SPOT_BASE])
+    return lower, upper
+
+
+def clip_soft(cmd_array: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """clip leg joint targets to the safe limits
+
+    arguments
+    cmd_array -- float32 leg joint targets in ORDERED_JOINT_NAMES_SPOT_BASE order
+    out -- array receiving the clipped targets, cmd_array itself when None
+
+    return out after clipping
+    """
+    lower, upper = _soft_limit_arrays()
+    return np.clip(cmd_array, lower, upper, out=cmd_array if out is None else out)
+
+
+def _policy_session_options() -> ort.SessionOptions:
+    """session options for running the small policy network once per control tick"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    # leave cores free for the state and command stream threads
+    options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // 2)
+    options.inter_op_num_threads = 1
+    return options
+
+
+def quantize_policy(policy_file_name: os.PathLike | str) -> str:
+    """dynamically quantize the policy weights to int8, caching the result next to it
+
+    the cache does not use the .onnx suffix so detect_policy_file still finds
+    exactly one policy in the directory
+
+    arguments
+    policy_file_name -- path to the fp32 onnx policy
+
+    return path to the quantized policy
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_file_name = f"{os.fspath(policy_file_name)}.int8"
+    if not os.path.exists(quantized_file_name) or os.path.getmtime(
+        quantized_file_name
+    ) < os.path.getmtime(policy_file_name):
+        quantize_dynamic(
+            policy_file_name, quantized_file_name, weight_type=QuantType.QInt8
+        )
+    return quantized_file_name
+
+
 class OnnxCommandGenerator:
     """class to be used as generator for spots command stream that executes
     an onnx model and converts the output to a spot command"""
@@ -127,12 +218,39 @@ class OnnxCommandGenerator:
         verbose: bool,
         logger: HDF5Logger | None = None,
         mock: bool = False,
+        quantize: bool = False,
+        clip_to_safe_limits: bool = False,
     ):
         self._context = context
         self._config = config
         self.logger = logger
         self.mock = mock
-        self._inference_session = ort.InferenceSession(policy_file_name)
+        if quantize:
+            # int8 weights perturb the actions, so this stays opt-in
+            policy_file_name = quantize_policy(policy_file_name)
+        self._inference_session = ort.InferenceSession(
+            policy_file_name,
+            sess_options=_policy_session_options(),
+            providers=["CPUExecutionProvider"],
+        )
+        # preallocated model inputs, refilled in place every tick
+        self._obs_buffers = {
+            model_input.name: np.zeros((1, model_input.shape[1]), dtype=np.float32)
+            for model_input in self._inference_session.get_inputs()
+        }
+        action_output = self._inference_session.get_outputs()[0]
+        self._action_buffer = np.zeros((1, action_output.shape[1]), dtype=np.float32)
+
+        # bind the preallocated buffers so inference reads and writes them in place
+        self._io_binding = self._inference_session.io_binding()
+        self._bound_values = []
+        for name, buffer in self._obs_buffers.items():
+            value = ort.OrtValue.ortvalue_from_numpy(buffer)
+            self._io_binding.bind_ortvalue_input(name, value)
+            self._bound_values.append(value)
+        value = ort.OrtValue.ortvalue_from_numpy(self._action_buffer)
+        self._io_binding.bind_ortvalue_output(action_output.name, value)
+        self._bound_values.append(value)
         self._last_action = [0] * 12  # extract_shift_from_onnx(policy_file_name)[:12]
         self._count = 1
         self._init_pos = None
@@ -143,53 +261,52 @@ class OnnxCommandGenerator:
             self._config.default_joints, ORDERED_JOINT_NAMES_SPOT
         )
 
+        # static permutation from the policy's joint order to spot's joint order,
+        # None when both orders already agree so the gather is skipped
+        isaac_to_spot = find_ordering(ORDERED_JOINT_NAMES_BASE_ISAAC, ORDERED_JOINT_NAMES_SPOT_BASE)
+        self._isaac_to_spot = (
+            None
+            if isaac_to_spot == list(range(len(isaac_to_spot)))
+            else np.asarray(isaac_to_spot, dtype=np.intp)
+        )
+        self._action_spot_buffer = np.empty(len(isaac_to_spot), dtype=np.float32)
+        # opt-in clamp of leg targets into the safe joint ranges
+        self._clip_to_safe_limits = clip_to_safe_limits
+
+        # gains only depend on the config, resolve them to spot joint order once
+        self._k_q_p = dict_to_list(self._config.kp, ORDERED_JOINT_NAMES_SPOT)
+        self._k_qd_p = dict_to_list(self._config.kd, ORDERED_JOINT_NAMES_SPOT)
+
         self.arm_offsets_ordered = [0.0, -3.1415, 3.1415, 1.5655, 0.00, -1.5655, 0.0]
         # dict_to_list(
         #     [0.0, -3.1415, 3.1415, 1.5655, 0.00, 0.0, 0.0], ORDERED_JOINT_NAMES_ARM_ISAAC
         # )
 
         self._triggered_safety = False
-        self._safety_pos = None
+        self._safety_proto = None
 
         self._safe_limits = self._generate_safe_limits()
+        # safe limits as arrays aligned with the joint order of the state stream
+        self._safe_names = list(ORDERED_JOINT_NAMES_SPOT_BASE)
+        self._safe_idx = np.array(
+            [ORDERED_JOINT_NAMES_SPOT.index(name) for name in self._safe_names],
+            dtype=np.intp,
+        )
+        self._safe_min, self._safe_max = _soft_limit_arrays()
 
     def _generate_safe_limits(self):
-        """
-        Generate safe limits for each joint based on the joint limits and soft limits.
-
-        The soft limits were generated from simulated data, using the formula:
-
-        max_val, min_val = max and min needed during simulation
-        max, min = max and min of the joint limit range
-
-        middle = (max + min)/2
-        full_range = max - min
-
-        min_margin = (middle - min_val)/full_range * 2
-        max_margin = (max_val - middle)/full_range * 2
+        """get the safe limits shared by all controllers, see _compute_safe_limits"""
+        safe_limits = _compute_safe_limits()
 
-        """
-        safe_limits = {}
-        for joint_name in JOINT_SOFT_LIMITS:
-            lower = JOINT_LIMITS[joint_name]["lower"]
-            upper = JOINT_LIMITS[joint_name]["upper"]
-            middle = (lower + upper) / 2
-            full_range = upper - lower
-
-            min_margin, max_margin = JOINT_SOFT_LIMITS[joint_name]
-            min_val = middle - (min_margin * full_range / 2)
-            max_val = middle + (max_margin * full_range / 2)
-
-            safe_limits[joint_name] = (min_val, max_val)
-
-        msg = "\nSafety Limits:\n"
-        msg += "\n".join(
-            [
-                f"  {joint_name}: [{min_val:.3f}, {max_val:.3f}]\n"
-                for joint_name, (min_val, max_val) in safe_limits.items()
-            ]
-        )
-        print(msg)
+        if self.verbose:
+            msg = "\nSafety Limits:\n"
+            msg += "\n".join(
+                [
+                    f"  {joint_name}: [{min_val:.3f}, {max_val:.3f}]\n"
+                    for joint_name, (min_val, max_val) in safe_limits.items()
+                ]
+            )
+            print(msg)
 
         return safe_limits
 
@@ -198,6 +315,13 @@ class OnnxCommandGenerator:
 
         return proto message to be used in spots command stream
         """
+        # once safety triggered only the timing fields of the hold command change
+        if self._safety_proto is not None:
+            set_timestamp_from_now(self._safety_proto.header.request_timestamp)
+            self._set_end_time(self._safety_proto.joint_command)
+            self._safety_proto.joint_command.user_command_key = self._count
+            return self._safety_proto
+
         t_start_call = time.perf_counter()
         if hasattr(self._context, "timing_dict"):
             last_call = self._context.timing_dict.get("last_call_time", t_start_call)
@@ -218,33 +342,25 @@ class OnnxCommandGenerator:
 
         # cache initial joint position when command stream starts
         if self._init_pos is None:
-            self._init_pos = self._context.latest_state.joint_states.position
-            self._init_load = self._context.latest_state.joint_states.load
-
-        if self._safety_pos is not None:
-            return self.create_proto(self._safety_pos)
+            # copy, state sources may reuse the same message for every update
+            self._init_pos = list(self._context.latest_state.joint_states.position)
+            self._init_load = list(self._context.latest_state.joint_states.load)
 
         # extract observation data from latest spot state data
         inputs_dict = self.collect_inputs(self._context.latest_state, self._config)
 
-        current_positions_map = dict(
-            zip(
-                ORDERED_JOINT_NAMES_SPOT,
-                self._context.latest_state.joint_states.position,
-            )
+        current_positions = np.asarray(
+            self._context.latest_state.joint_states.position
         )
 
         # Safety Check
-        self._triggered_safety = False  # self._check_safety(current_positions_map)
+        self._triggered_safety = False  # self._check_safety(current_positions)
 
         if self._triggered_safety:
             print("Triggered safety")
-            # Create hold command from current positions
-            hold_pos = [
-                current_positions_map[name] for name in ORDERED_JOINT_NAMES_SPOT
-            ]
-            self._safety_pos = hold_pos
-            return self.create_proto(hold_pos)
+            # Create hold command from current positions, already in spot joint order
+            self._safety_proto = self.create_proto(current_positions.tolist())
+            return self._safety_proto
 
         if self.mock:
             # Action of zeros results in default joint values after post-processing
@@ -257,7 +373,7 @@ class OnnxCommandGenerator:
             t_onx_end = time.perf_counter()
 
         t_post_start = time.perf_counter()
-        action = output
+        action = self._post_process_action_to_spot(output)
         t_post_end = time.perf_counter()
 
         # generate proto message from target joint positions
@@ -282,16 +398,17 @@ class OnnxCommandGenerator:
                 ),
                 raw_joint_velocities=ob.get_joint_velocity(raw_state),
                 raw_joint_loads=ob.get_join_load(raw_state),
-                response_timestamp=ob.get_response_timestamp(raw_state),
+                # convert now, state sources may reuse the timestamp message every tick
+                response_timestamp=ob.get_response_timestamp(raw_state).ToDatetime(),
                 spot_current_positions=list(raw_state.joint_states.position),
                 spot_current_velocities=list(raw_state.joint_states.velocity),
-                preprocessed_base_linear_velocity=inputs_dict["base_linear_velocity"],
-                preprocessed_base_angular_velocity=inputs_dict["base_angular_velocity"],
-                preprocessed_projected_gravity=inputs_dict["projected_gravity"],
-                preprocessed_velocity_cmd=inputs_dict["velocity_commands"],
-                preprocessed_joint_positions=inputs_dict["joint_positions"],
-                preprocessed_joint_velocities=inputs_dict["joint_velocities"],
-                preprocessed_last_action=inputs_dict["last_actions"],
+                preprocessed_base_linear_velocity=inputs_dict["base_linear_velocity"].copy(),
+                preprocessed_base_angular_velocity=inputs_dict["base_angular_velocity"].copy(),
+                preprocessed_projected_gravity=inputs_dict["projected_gravity"].copy(),
+                preprocessed_velocity_cmd=inputs_dict["velocity_commands"].copy(),
+                preprocessed_joint_positions=inputs_dict["joint_positions"].copy(),
+                preprocessed_joint_velocities=inputs_dict["joint_velocities"].copy(),
+                preprocessed_last_action=inputs_dict["last_actions"].copy(),
                 commanded_action=action,
                 dt_divider_wait=dt_divider_wait,
                 dt_divider_to_onnx=dt_divider_to_onnx,
@@ -314,27 +431,60 @@ class OnnxCommandGenerator:
 
         return proto
 
-    def _check_safety(self, current_positions_map):
-        for joint_name, (safe_min, safe_max) in self._safe_limits.items():
-            current_val = current_positions_map.get(joint_name)
+    def _check_safety(self, current_positions: np.ndarray) -> bool:
+        """check joint positions against the safe limits
 
-            if current_val is None:
-                print(f"[SAFETY STOP] Joint {joint_name} value is None")
-                return True
+        arguments
+        current_positions -- joint positions in ORDERED_JOINT_NAMES_SPOT order
 
-            if current_val < safe_min or current_val > safe_max:
-                print(
-                    f"[SAFETY STOP] Joint {joint_name} value {current_val:.4f} outside safe range [{safe_min:.4f}, {safe_max:.4f}]"
-                )
-                return True
+        return True if any limited joint is missing or outside its safe range
+        """
+        if len(current_positions) <= self._safe_idx.max():
+            print(
+                f"[SAFETY STOP] Expected {self._safe_idx.max() + 1} joint values, got {len(current_positions)}"
+            )
+            return True
+
+        values = current_positions[self._safe_idx]
+        outside = (values < self._safe_min) | (values > self._safe_max)
+        if outside.any():
+            i = int(np.flatnonzero(outside)[0])
+            print(
+                f"[SAFETY STOP] Joint {self._safe_names[i]} value {values[i]:.4f} outside safe range [{self._safe_min[i]:.4f}, {self._safe_max[i]:.4f}]"
+            )
+            return True
         return False
 
-    def _compute_action(self, input_dict: dict[str, float]):
-        # execute model from onnx file
-        output = self._inference_session.run(None, input_dict)[0].tolist()[
-            0
-        ]  # add arm offsets
-        return output
+    def _compute_action(self, input_dict: dict[str, np.ndarray]) -> np.ndarray:
+        """execute model from onnx file on the bound input buffers
+
+        arguments
+        input_dict -- model inputs, normally the buffers returned by collect_inputs
+
+        return view of the preallocated action buffer, overwritten on the next call
+        """
+        if input_dict is not self._obs_buffers:
+            for name, value in input_dict.items():
+                self._obs_buffers[name][0] = np.asarray(value, dtype=np.float32).reshape(-1)
+        self._inference_session.run_with_iobinding(self._io_binding)
+        return self._action_buffer[0]
+
+    def _post_process_action_to_spot(self, output: List[float]) -> List[float]:
+        """reorder leg joint targets from the policy's joint order to spot's
+
+        arguments
+        output -- leg joint targets as returned by the model
+
+        return list of leg joint targets in spot's joint order, clipped to the safe
+        limits when clip_to_safe_limits is set
+        """
+        action = np.asarray(output, dtype=np.float32)
+        if self._isaac_to_spot is not None:
+            action = np.take(action, self._isaac_to_spot, out=self._action_spot_buffer)
+        if self._clip_to_safe_limits:
+            # clip into the spot buffer, output may be the bound model output kept as last action
+            action = clip_soft(action, out=self._action_spot_buffer)
+        return action.tolist()
 
     def collect_inputs(
         self,
@@ -348,38 +498,52 @@ class OnnxCommandGenerator:
         state -- proto msg with spots latest state
         config -- model configuration data from orbit
 
-        return dict of isolated preprocessed observations
+        return dict of isolated preprocessed observations, the arrays are reused
+        between calls so copy them if they need to outlive the next tick
         """
         if self.verbose:
             print("[INFO] cmd", self._context.velocity_cmd)
 
-        return {
-            "base_linear_velocity": ob.get_base_linear_velocity(state)
-            .astype(np.float32)
-            .reshape(1, 3),
-            "base_angular_velocity": ob.get_base_angular_velocity(state)
-            .astype(np.float32)
-            .reshape(1, 3),
-            "projected_gravity": ob.get_projected_gravity(state)
-            .astype(np.float32)
-            .reshape(1, 3),
-            "velocity_commands": np.array(self._context.velocity_cmd)
-            .astype(np.float32)
-            .reshape(1, 3),
-            # "joint_commands": joint_commands
-            # if joint_commands is not None
-            # else ob.generate_joint_commands(state),
-            # # TODO
-            "joint_positions": np.array(state.joint_states.position)
-            .astype(np.float32)
-            .reshape(1, -1),
-            "joint_velocities": np.array(state.joint_states.velocity)
-            .astype(np.float32)
-            .reshape(1, -1),
-            "last_actions": np.array(self._last_action)
-            .astype(np.float32)
-            .reshape(1, -1),
-        }
+        # callers may pass (1, N) nested lists, flatten every term into its row
+        buffers = self._obs_buffers
+        buffers["base_linear_velocity"][0] = np.asarray(
+            ob.get_base_linear_velocity(state), dtype=np.float32
+        ).reshape(-1)
+        buffers["base_angular_velocity"][0] = np.asarray(
+            ob.get_base_angular_velocity(state), dtype=np.float32
+        ).reshape(-1)
+        buffers["projected_gravity"][0] = np.asarray(
+            ob.get_projected_gravity(state), dtype=np.float32
+        ).reshape(-1)
+        buffers["velocity_commands"][0] = np.asarray(
+            self._context.velocity_cmd, dtype=np.float32
+        ).reshape(-1)
+        # "joint_commands": joint_commands
+        # if joint_commands is not None
+        # else ob.generate_joint_commands(state),
+        # # TODO
+        buffers["joint_positions"][0] = np.asarray(
+            state.joint_states.position, dtype=np.float32
+        ).reshape(-1)
+        buffers["joint_velocities"][0] = np.asarray(
+            state.joint_states.velocity, dtype=np.float32
+        ).reshape(-1)
+        buffers["last_actions"][0] = np.asarray(
+            self._last_action, dtype=np.float32
+        ).reshape(-1)
+        return buffers
+
+    def _set_end_time(self, joint_command):
+        """let a joint command expire 0.1s after the latest state observation
+
+        arguments
+        joint_command -- joint command part of the proto msg to update
+        """
+        observation_time = self._context.latest_state.joint_states.acquisition_timestamp
+        # integer timestamp arithmetic, avoids the float round trip and temporary protos
+        nanos = observation_time.nanos + 100_000_000
+        joint_command.end_time.seconds = observation_time.seconds + nanos // 1_000_000_000
+        joint_command.end_time.nanos = nanos % 1_000_000_000
 
     def create_proto(self, pos_command: List[float]):
         """generate a proto msg for spot with a given pos_command
@@ -396,31 +560,17 @@ class OnnxCommandGenerator:
         set_timestamp_from_now(update_proto.header.request_timestamp)
         update_proto.header.client_name = "rl_example_client"
 
-        k_q_p = dict_to_list(self._config.kp, ORDERED_JOINT_NAMES_SPOT)
-        k_qd_p = dict_to_list(self._config.kd, ORDERED_JOINT_NAMES_SPOT)
-
-        N_DOF = len(pos_command)
-        pos_cmd = [0] * N_DOF
-        vel_cmd = [0] * N_DOF
-        load_cmd = [0] * N_DOF
-
-        for joint_ind in range(N_DOF):
-            pos_cmd[joint_ind] = pos_command[joint_ind]
-            vel_cmd[joint_ind] = 0
-            load_cmd[joint_ind] = 0
-
         # Fill in gains the first dt
         if self._count <= 3:
-            update_proto.joint_command.gains.k_q_p.extend(k_q_p)
-            update_proto.joint_command.gains.k_qd_p.extend(k_qd_p)
+            update_proto.joint_command.gains.k_q_p.extend(self._k_q_p)
+            update_proto.joint_command.gains.k_qd_p.extend(self._k_qd_p)
 
-        update_proto.joint_command.position.extend(pos_cmd)
-        update_proto.joint_command.velocity.extend(vel_cmd)
-        update_proto.joint_command.load.extend(load_cmd)
+        zeros = [0.0] * len(pos_command)
+        update_proto.joint_command.position.extend(pos_command)
+        update_proto.joint_command.velocity.extend(zeros)
+        update_proto.joint_command.load.extend(zeros)
 
-        observation_time = self._context.latest_state.joint_states.acquisition_timestamp
-        end_time = seconds_to_timestamp(timestamp_to_sec(observation_time) + 0.1)
-        update_proto.joint_command.end_time.CopyFrom(end_time)
+        self._set_end_time(update_proto.joint_command)
 
         # Let it extrapolate the command a little
         update_proto.joint_command.extrapolation_duration.nanos = int(5 * 1e6)
@@ -461,9 +611,7 @@ class OnnxCommandGenerator:
         update_proto.joint_command.velocity.extend(vel_cmd)
         update_proto.joint_command.load.extend(load_cmd)
 
-        observation_time = self._context.latest_state.joint_states.acquisition_timestamp
-        end_time = seconds_to_timestamp(timestamp_to_sec(observation_time) + 0.1)
-        update_proto.joint_command.end_time.CopyFrom(end_time)
+        self._set_end_time(update_proto.joint_command)
 
         # Let it extrapolate the command a little
         update_proto.joint_command.extrapolation_duration.nanos = int(5 * 1e6)
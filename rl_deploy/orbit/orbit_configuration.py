@@ -1,20 +1,19 @@
 # Copyright (c) 2024 Boston Dynamics AI Institute LLC. All rights reserved.
 
 from rl_deploy.orbit.orbit_constants import ORDERED_JOINT_NAMES_ARM_ISAAC
+import functools
 import json
 import os
 import re
 from dataclasses import dataclass
 from typing import List
 
-import yaml
-
 from rl_deploy.orbit.orbit_constants import ORDERED_JOINT_NAMES_ISAAC
 from rl_deploy.utils.dict_tools import dict_from_lists, set_matching
-from rl_deploy.spot.constants import DEFAULT_K_Q_P, DEFAULT_K_QD_P, DOF
+from rl_deploy.spot.constants import DEFAULT_K_Q_P, DEFAULT_K_QD_P, DOF_IDX
 
 
-class Ref(yaml.YAMLObject):
+class Ref:
     yaml_tag = "tag:yaml.org,2002:python/tuple"
 
     def __init__(self, val):
@@ -25,7 +24,7 @@ class Ref(yaml.YAMLObject):
         return tuple(node.value)
 
 
-class Slices(yaml.YAMLObject):
+class Slices:
     yaml_tag = "python/object/apply:builtins.slice"
 
     @classmethod
@@ -39,10 +38,23 @@ class Slices(yaml.YAMLObject):
             return slice(values[0].value, values[1].value, values[2].value)
 
 
-yaml.SafeLoader.add_constructor("tag:yaml.org,2002:python/tuple", Ref.from_yaml)
-yaml.SafeLoader.add_constructor(
-    "tag:yaml.org,2002:python/object/apply:builtins.slice", Slices.from_yaml
-)
+@functools.cache
+def _yaml_loader():
+    """import yaml on first use and return a safe loader with the custom tags registered"""
+    try:
+        from yaml import CSafeLoader as _Loader
+    except ImportError:
+        from yaml import SafeLoader as _Loader
+
+    _Loader.add_constructor("tag:yaml.org,2002:python/tuple", Ref.from_yaml)
+    _Loader.add_constructor(
+        "tag:yaml.org,2002:python/object/apply:builtins.slice", Slices.from_yaml
+    )
+    return _Loader
+
+
+# memoized so repeated calls to load_configuration reuse the same pattern objects
+_compile_regex = functools.lru_cache(maxsize=None)(re.compile)
 
 
 @dataclass
@@ -56,25 +68,61 @@ class OrbitConfig:
     action_scale: float
 
 
-def detect_config_file(directory: os.PathLike | str) -> dict | None:
-    """find and parse json or yaml file in policy directory
+_POLICY_DIRECTORY_SUFFIXES = ("env.json", "env.yaml", ".onnx")
+
+
+@functools.lru_cache(maxsize=8)
+def _scan_policy_directory(directory: str, mtime: float) -> dict[str, tuple[str, ...]]:
+    """classify the files of a policy directory by suffix in a single pass
 
     arguments
     directory -- path where policy and training configuration can be found
+    mtime -- modification time of directory, only used to invalidate the cache
+
+    return dictionary mapping each known suffix to the matching file paths
+    """
+    found = {suffix: [] for suffix in _POLICY_DIRECTORY_SUFFIXES}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            for suffix in _POLICY_DIRECTORY_SUFFIXES:
+                if entry.name.endswith(suffix):
+                    found[suffix].append(entry.path)
+    return {suffix: tuple(paths) for suffix, paths in found.items()}
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_config_file(filepath: str, mtime: float) -> dict:
+    """parse a json or yaml training configuration file
+
+    arguments
+    filepath -- path to the configuration file
+    mtime -- modification time of filepath, only used to invalidate the cache
 
     return dictionary from config file
     """
-    files = [f for f in os.listdir(directory) if f.endswith("env.json")]
-    if len(files) == 1:
-        filepath = os.path.join(directory, files[0])
-        with open(filepath) as f:
+    with open(filepath) as f:
+        if filepath.endswith(".json"):
             return json.load(f)
 
-    files = [f for f in os.listdir(directory) if f.endswith("env.yaml")]
-    if len(files) == 1:
-        filepath = os.path.join(directory, files[0])
-        with open(filepath) as f:
-            return yaml.safe_load(f)
+        import yaml
+
+        return yaml.load(f, Loader=_yaml_loader())
+
+
+def detect_config_file(directory: os.PathLike | str) -> dict | None:
+    """find and parse json or yaml file in policy directory
+
+    arguments
+    directory -- path where policy and training configuration can be found
+
+    return dictionary from config file
+    """
+    directory = os.fspath(directory)
+    found = _scan_policy_directory(directory, os.path.getmtime(directory))
+    for suffix in ("env.json", "env.yaml"):
+        if len(found[suffix]) == 1:
+            filepath = found[suffix][0]
+            return _parse_config_file(filepath, os.path.getmtime(filepath))
 
     return None
 
@@ -87,9 +135,10 @@ def detect_policy_file(directory: os.PathLike | str) -> str | None:
 
     return filepath to onnx file
     """
-    files = [f for f in os.listdir(directory) if f.endswith(".onnx")]
-    if len(files) == 1:
-        return os.path.join(directory, files[0])
+    directory = os.fspath(directory)
+    found = _scan_policy_directory(directory, os.path.getmtime(directory))
+    if len(found[".onnx"]) == 1:
+        return found[".onnx"][0]
     return None
 
 
@@ -108,25 +157,33 @@ def load_configuration(env_config: dict) -> OrbitConfig:
 
     actuators = env_config["scene"]["robot"]["actuators"]
 
-    for group in actuators.keys():
-        regex = re.compile(actuators[group]["joint_names_expr"][0])
-
-        set_matching(joint_kp, regex, actuators[group]["stiffness"])
-        set_matching(joint_kd, regex, actuators[group]["damping"])
+    compiled_actuators = [
+        (
+            _compile_regex(actuator["joint_names_expr"][0]),
+            actuator["stiffness"],
+            actuator["damping"],
+        )
+        for actuator in actuators.values()
+    ]
+    for regex, stiffness, damping in compiled_actuators:
+        set_matching(joint_kp, regex, stiffness)
+        set_matching(joint_kd, regex, damping)
 
     default_joint_data = env_config["scene"]["robot"]["init_state"]["joint_pos"]
-    default_joint_expressions = default_joint_data.keys()
-    for expression in default_joint_expressions:
-        regex = re.compile(expression)
-        set_matching(joint_offsets, regex, default_joint_data[expression])
+    compiled_offsets = [
+        (_compile_regex(expression), value)
+        for expression, value in default_joint_data.items()
+    ]
+    for regex, value in compiled_offsets:
+        set_matching(joint_offsets, regex, value)
 
     action_scale = env_config["actions"]["joint_pos"]["scale"]
     standing_height = env_config["scene"]["robot"]["init_state"]["pos"][2]
 
     # Override the arm with default values for kp, kd
     for joint_name in ORDERED_JOINT_NAMES_ARM_ISAAC:
-        joint_kp[joint_name] = DEFAULT_K_Q_P[DOF[joint_name.upper()]]
-        joint_kd[joint_name] = DEFAULT_K_QD_P[DOF[joint_name.upper()]]
+        joint_kp[joint_name] = float(DEFAULT_K_Q_P[DOF_IDX[joint_name.upper()]])
+        joint_kd[joint_name] = float(DEFAULT_K_QD_P[DOF_IDX[joint_name.upper()]])
         print(
             f"Setting {joint_name} kp to {joint_kp[joint_name]} and kd to {joint_kd[joint_name]}"
         )
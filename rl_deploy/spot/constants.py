@@ -8,9 +8,10 @@
 import os
 from enum import IntEnum
 
+import numpy as np
 from bosdyn.api.spot import spot_constants_pb2
 
-from rl_deploy.utils.urdf import parse_urdf_limits
+from rl_deploy.utils.urdf import load_limits_cached
 
 
 class DOF(IntEnum):
@@ -42,6 +43,10 @@ class DOF(IntEnum):
     N_DOF = 19
 
 
+# plain int indices for code that indexes per joint, skips IntEnum.__index__
+DOF_IDX = {member.name: int(member) for member in DOF}
+
+
 # the reference is https://dev.bostondynamics.com/protos/bosdyn/api/proto_reference#jointindex
 ORDERED_JOINT_NAMES_SPOT_BASE = [
     "fl_hx",
@@ -73,60 +78,36 @@ ORDERED_JOINT_NAMES_SPOT = ORDERED_JOINT_NAMES_SPOT_BASE + ORDERED_JOINT_NAMES_S
 
 
 # Default joint gains
-DEFAULT_K_Q_P = [0] * DOF.N_DOF
-DEFAULT_K_QD_P = [0] * DOF.N_DOF
+DEFAULT_K_Q_P = np.zeros(DOF.N_DOF, dtype=np.float64)
+DEFAULT_K_QD_P = np.zeros(DOF.N_DOF, dtype=np.float64)
 
 
 def set_default_gains():
     # All legs have the same gains
-    HX_K_Q_P = 624
-    HX_K_QD_P = 5.20
-    HY_K_Q_P = 936
-    HY_K_QD_P = 5.20
-    KN_K_Q_P = 286
-    KN_K_QD_P = 2.04
+    HX = [DOF.FL_HX, DOF.FR_HX, DOF.HL_HX, DOF.HR_HX]
+    HY = [DOF.FL_HY, DOF.FR_HY, DOF.HL_HY, DOF.HR_HY]
+    KN = [DOF.FL_KN, DOF.FR_KN, DOF.HL_KN, DOF.HR_KN]
 
     # Leg gains
-    DEFAULT_K_Q_P[DOF.FL_HX] = HX_K_Q_P
-    DEFAULT_K_QD_P[DOF.FL_HX] = HX_K_QD_P
-    DEFAULT_K_Q_P[DOF.FL_HY] = HY_K_Q_P
-    DEFAULT_K_QD_P[DOF.FL_HY] = HY_K_QD_P
-    DEFAULT_K_Q_P[DOF.FL_KN] = KN_K_Q_P
-    DEFAULT_K_QD_P[DOF.FL_KN] = KN_K_QD_P
-    DEFAULT_K_Q_P[DOF.FR_HX] = HX_K_Q_P
-    DEFAULT_K_QD_P[DOF.FR_HX] = HX_K_QD_P
-    DEFAULT_K_Q_P[DOF.FR_HY] = HY_K_Q_P
-    DEFAULT_K_QD_P[DOF.FR_HY] = HY_K_QD_P
-    DEFAULT_K_Q_P[DOF.FR_KN] = KN_K_Q_P
-    DEFAULT_K_QD_P[DOF.FR_KN] = KN_K_QD_P
-    DEFAULT_K_Q_P[DOF.HL_HX] = HX_K_Q_P
-    DEFAULT_K_QD_P[DOF.HL_HX] = HX_K_QD_P
-    DEFAULT_K_Q_P[DOF.HL_HY] = HY_K_Q_P
-    DEFAULT_K_QD_P[DOF.HL_HY] = HY_K_QD_P
-    DEFAULT_K_Q_P[DOF.HL_KN] = KN_K_Q_P
-    DEFAULT_K_QD_P[DOF.HL_KN] = KN_K_QD_P
-    DEFAULT_K_Q_P[DOF.HR_HX] = HX_K_Q_P
-    DEFAULT_K_QD_P[DOF.HR_HX] = HX_K_QD_P
-    DEFAULT_K_Q_P[DOF.HR_HY] = HY_K_Q_P
-    DEFAULT_K_QD_P[DOF.HR_HY] = HY_K_QD_P
-    DEFAULT_K_Q_P[DOF.HR_KN] = KN_K_Q_P
-    DEFAULT_K_QD_P[DOF.HR_KN] = KN_K_QD_P
-
-    # Arm gains
-    DEFAULT_K_Q_P[DOF.ARM_SH0] = 1020
-    DEFAULT_K_QD_P[DOF.ARM_SH0] = 10.2
-    DEFAULT_K_Q_P[DOF.ARM_SH1] = 255
-    DEFAULT_K_QD_P[DOF.ARM_SH1] = 15.3
-    DEFAULT_K_Q_P[DOF.ARM_EL0] = 204
-    DEFAULT_K_QD_P[DOF.ARM_EL0] = 10.2
-    DEFAULT_K_Q_P[DOF.ARM_EL1] = 102
-    DEFAULT_K_QD_P[DOF.ARM_EL1] = 2.04
-    DEFAULT_K_Q_P[DOF.ARM_WR0] = 102
-    DEFAULT_K_QD_P[DOF.ARM_WR0] = 2.04
-    DEFAULT_K_Q_P[DOF.ARM_WR1] = 102
-    DEFAULT_K_QD_P[DOF.ARM_WR1] = 2.04
-    DEFAULT_K_Q_P[DOF.ARM_F1X] = 16.0
-    DEFAULT_K_QD_P[DOF.ARM_F1X] = 0.32
+    DEFAULT_K_Q_P[HX] = 624
+    DEFAULT_K_QD_P[HX] = 5.20
+    DEFAULT_K_Q_P[HY] = 936
+    DEFAULT_K_QD_P[HY] = 5.20
+    DEFAULT_K_Q_P[KN] = 286
+    DEFAULT_K_QD_P[KN] = 2.04
+
+    # Arm gains, in DOF order
+    ARM = [
+        DOF.ARM_SH0,
+        DOF.ARM_SH1,
+        DOF.ARM_EL0,
+        DOF.ARM_EL1,
+        DOF.ARM_WR0,
+        DOF.ARM_WR1,
+        DOF.ARM_F1X,
+    ]
+    DEFAULT_K_Q_P[ARM] = [1020, 255, 204, 102, 102, 102, 16.0]
+    DEFAULT_K_QD_P[ARM] = [10.2, 15.3, 10.2, 2.04, 2.04, 2.04, 0.32]
 
 
 # Initialize default gains
@@ -134,7 +115,7 @@ set_default_gains()
 
 from pathlib import Path
 
-JOINT_LIMITS = parse_urdf_limits(
+JOINT_LIMITS = load_limits_cached(
     os.path.join(Path(__file__).parent.parent, "spot_with_arm.urdf")
 )
 
@@ -1,6 +1,7 @@
 # Copyright (c) 2024 Boston Dynamics AI Institute LLC. All rights reserved.
 
 import argparse
+import logging
 import sys
 from pathlib import Path
 
@@ -19,6 +20,8 @@ from rl_deploy.utils.hdf5_logger import HDF5Logger
 
 from datetime import datetime
 
+log = logging.getLogger(__name__)
+
 
 def main():
     """Command line interface. change that is ok"""
@@ -31,6 +34,16 @@ def main():
         help="Path to the policy file or directory containing the policy file.",
     )
     parser.add_argument("-m", "--mock", action="store_true")
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Run an int8 dynamically quantized copy of the policy.",
+    )
+    parser.add_argument(
+        "--clip_to_safe_limits",
+        action="store_true",
+        help="Clip leg joint targets to the safe joint limits before sending them.",
+    )
     parser.add_argument(
         "--hdf5_log",
         type=str,
@@ -38,20 +51,27 @@ def main():
         help="Path to save HDF5 log of observations.",
     )
     options = parser.parse_args()
+    bosdyn.client.util.setup_logging(options.verbose)
 
     env_config = orbit.orbit_configuration.detect_config_file(options.policy_file_path)
     policy_file = orbit.orbit_configuration.detect_policy_file(options.policy_file_path)
 
     config = orbit.orbit_configuration.load_configuration(env_config)
-    print("Loaded configs: ", config)
+    log.debug("Loaded configs: %s", config)
 
     context = OnnxControllerContext()
     state_handler = StateHandler(context)
-    print("Verbose option: ", options.verbose)
+    log.debug("Verbose option: %s", options.verbose)
 
     logger = HDF5Logger(options.hdf5_log)
     command_generator = OnnxCommandGenerator(
-        context, config, policy_file, options.verbose, logger=logger
+        context,
+        config,
+        policy_file,
+        options.verbose,
+        logger=logger,
+        quantize=options.quantize,
+        clip_to_safe_limits=options.clip_to_safe_limits,
     )
     gamepad = TerminalKeyboard(context)
     # 333 Hz state update / 6 => ~56 Hz control updates
@@ -1,5 +1,6 @@
 # Copyright (c) 2024 Boston Dynamics AI Institute LLC. All rights reserved.
 
+from re import Pattern
 from typing import Any, List
 
 
@@ -28,12 +29,12 @@ def dict_to_list(data: dict, keys: List):
     return [data.get(key) for key in keys]
 
 
-def set_matching(data: dict, regex, value):
+def set_matching(data: dict, regex: Pattern, value):
     """set values in dict with keys matching regex
 
     arguments
     dict -- dictionary to set keys in
-    regex -- regex to select keys that will be set
+    regex -- precompiled regex to select keys that will be set
     value -- value to set keys matching regex to
     """
     for key in data:
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import xml.etree.ElementTree as ET
 
@@ -22,19 +24,63 @@ def parse_urdf_limits(urdf_path):
         if joint.attrib.get("type") == "fixed":
             continue
 
-        # validate limits exist        
-        if limit is None: 
+        # validate limits exist
+        if limit is None:
             raise ValueError(f"Joint {name} has no limit tag.")
-        if 'lower' not in limit.attrib:
-            raise ValueError(f"Joint {name} limit tag missing 'lower' attributes.")
-        if 'upper' not in limit.attrib:
-            raise ValueError(f"Joint {name} limit tag missing 'upper' attributes.")
-        if 'velocity' not in limit.attrib:
+        attrib = limit.attrib
+        if not attrib.keys() >= {"lower", "upper"}:
+            missing = sorted({"lower", "upper"} - attrib.keys())
+            raise ValueError(f"Joint {name} limit tag missing {missing} attributes.")
+        if "velocity" not in attrib:
             print(f"Warning: Joint {name} limit tag missing 'velocity' attribute. Setting to infinity.")
 
-        lower = float(limit.attrib["lower"])
-        upper = float(limit.attrib["upper"])
-        velocity = float(limit.attrib.get("velocity", float("inf")))
+        lower, upper = float(attrib["lower"]), float(attrib["upper"])
+        velocity = float(attrib.get("velocity", "inf"))
         limits[name] = {'lower': lower, 'upper': upper, 'velocity': velocity}
     
     return limits
+
+
+# bump whenever parse_urdf_limits or the cached layout changes
+_LIMITS_CACHE_VERSION = 1
+
+
+def _limits_cache_path(urdf_path):
+    """cache file for urdf_path in the user cache directory, outside the source tree"""
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "rl_deploy"
+    )
+    digest = hashlib.sha1(os.path.abspath(urdf_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(urdf_path)}.{digest}.limits.json")
+
+
+def load_limits_cached(urdf_path):
+    """
+    Same as parse_urdf_limits, but caches the result as JSON in the user cache
+    directory. The cache is reused while the URDF modification time and the
+    parser version are unchanged.
+    """
+    cache_path = _limits_cache_path(urdf_path)
+    key = {
+        "version": _LIMITS_CACHE_VERSION,
+        "urdf": os.path.abspath(urdf_path),
+        "mtime": os.stat(urdf_path).st_mtime,
+    }
+
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return cached["limits"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    limits = parse_urdf_limits(urdf_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({"key": key, "limits": limits}, f)
+    except OSError:
+        # unwritable cache directory, parse again next time
+        pass
+    return limits